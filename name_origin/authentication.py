@@ -0,0 +1,47 @@
+import hashlib
+import threading
+import time
+
+from cachetools import TTLCache
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+# Validated tokens are remembered briefly, so repeated requests with the same token
+# skip signature verification and the user lookup. Keep this well below the access
+# token lifetime: a deactivated user stays authenticated for at most this long
+TOKEN_CACHE_TTL = 30  # seconds
+
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()  # TTLCache is not thread-safe
+
+
+# Drop-in replacement for JWTAuthentication that caches (user, validated_token)
+# per raw token in process memory
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        # Key on a digest so raw tokens are never kept in memory
+        cache_key = hashlib.sha256(raw_token).digest()
+        with _token_cache_lock:
+            cached = _token_cache.get(cache_key)
+        # Never serve a cached entry past the token's own expiry
+        if cached is not None and cached[1]["exp"] > time.time():
+            return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        user_auth = (self.get_user(validated_token), validated_token)
+        with _token_cache_lock:
+            _token_cache[cache_key] = user_auth
+        return user_auth
+
+
+# Document the cached authenticator in the OpenAPI schema just like JWTAuthentication
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = CachedJWTAuthentication
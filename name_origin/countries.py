@@ -0,0 +1,112 @@
+from .models import Country, CountryBorder
+
+# Country fields filled from restcountries.com metadata
+COUNTRY_METADATA_FIELDS = [
+    "name",
+    "official_name",
+    "alpha3",
+    "region",
+    "independent",
+    "capital",
+    "capital_lat",
+    "capital_lng",
+    "google_maps_url",
+    "openstreetmap_url",
+    "flag_png",
+    "flag_svg",
+    "flag_alt",
+    "coat_of_arms_png",
+    "coat_of_arms_svg",
+]
+
+
+def parse_country_data(data):
+    # Extract key metadata for country creation from a restcountries.com v3.1 entry.
+    # Nested sections are looked up once and reused for every field taken from them
+    name = data.get("name", {})
+    capital_latlng = data.get("capitalInfo", {}).get("latlng") or (None, None)
+    maps = data.get("maps", {})
+    flags = data.get("flags", {})
+    coat_of_arms = data.get("coatOfArms", {})
+
+    return {
+        "name": name.get("common"),
+        "official_name": name.get("official"),
+        "alpha3": data.get("cca3"),
+        "region": data.get("region"),
+        "independent": data.get("independent"),
+        "capital": (data.get("capital") or [None])[0],
+        "capital_lat": capital_latlng[0],
+        "capital_lng": capital_latlng[1],
+        "google_maps_url": maps.get("googleMaps"),
+        "openstreetmap_url": maps.get("openStreetMaps"),
+        "flag_png": flags.get("png"),
+        "flag_svg": flags.get("svg"),
+        "flag_alt": flags.get("alt"),
+        "coat_of_arms_png": coat_of_arms.get("png"),
+        "coat_of_arms_svg": coat_of_arms.get("svg"),
+        "borders": data.get("borders", []),
+    }
+
+
+def save_countries(metadata):
+    # Upsert countries from {alpha-2 code: parsed metadata} in a single
+    # INSERT ... ON CONFLICT statement and return {alpha-2 code: border alpha-3 codes}.
+    # Countries whose metadata lookup failed are only inserted when missing,
+    # so a transient upstream error can't blank out data stored earlier
+    borders_by_code = {}
+    fetched_countries = []
+    unfetched_countries = []
+    for code, country_data in metadata.items():
+        country_data = dict(country_data)
+        borders_by_code[code] = country_data.pop("borders", [])
+        if country_data:
+            fetched_countries.append(Country(code=code, **country_data))
+        else:
+            unfetched_countries.append(Country(code=code))
+
+    if fetched_countries:
+        Country.objects.bulk_create(
+            fetched_countries,
+            update_conflicts=True,
+            unique_fields=["code"],
+            update_fields=COUNTRY_METADATA_FIELDS,
+            batch_size=500,
+        )
+    if unfetched_countries:
+        Country.objects.bulk_create(unfetched_countries, ignore_conflicts=True)
+
+    return borders_by_code
+
+
+def save_borders(countries, borders_by_code):
+    # Store borders for {alpha-2 code: Country} given {alpha-2 code: border alpha-3 codes}.
+    # Neighbors are resolved with a single query; alpha3 is not unique (it is blank when
+    # metadata is missing), so in_bulk() can't be used
+    all_border_codes = set().union(*borders_by_code.values())
+    neighbors_by_alpha3 = {
+        c.alpha3: c for c in Country.objects.filter(alpha3__in=all_border_codes)
+    }
+
+    border_pairs = set()
+    for country_code, borders in borders_by_code.items():
+        country = countries[country_code]
+        for border_code in borders:
+            neighbor = neighbors_by_alpha3.get(border_code)
+            if neighbor is None:
+                # If the country hasn't been created yet (e.g. not in any name result), skip it
+                continue
+
+            # Always store borders in sorted order to prevent duplicate A–B and B–A records
+            from_country, to_country = sorted([country, neighbor], key=lambda c: c.code)
+            border_pairs.add((from_country, to_country))
+
+    # unique_together on (from_country, to_country) makes ignore_conflicts safe
+    CountryBorder.objects.bulk_create(
+        [
+            CountryBorder(from_country=from_country, to_country=to_country)
+            for from_country, to_country in border_pairs
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
@@ -0,0 +1,55 @@
+import orjson
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from name_origin.countries import parse_country_data, save_borders, save_countries
+from name_origin.models import Country
+
+RESTCOUNTRIES_ALL_URL = "https://restcountries.com/v3.1/all"
+
+# /all accepts at most 10 fields per request, so metadata and borders are fetched
+# separately and merged by alpha-2 code
+METADATA_FIELDS = (
+    "cca2,cca3,name,region,independent,capital,capitalInfo,maps,flags,coatOfArms"
+)
+BORDER_FIELDS = "cca2,borders"
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload all countries and the border graph from restcountries.com, "
+        "so name lookups don't have to fetch them at request time."
+    )
+
+    def handle(self, *args, **options):
+        entries = self.fetch_all(METADATA_FIELDS)
+        borders = {
+            entry["cca2"]: entry.get("borders", [])
+            for entry in self.fetch_all(BORDER_FIELDS)
+        }
+
+        metadata = {}
+        for entry in entries:
+            country_data = parse_country_data(entry)
+            country_data["borders"] = borders.get(entry["cca2"], [])
+            metadata[entry["cca2"]] = country_data
+
+        with transaction.atomic():
+            borders_by_code = save_countries(metadata)
+            countries = Country.objects.in_bulk(list(metadata), field_name="code")
+            save_borders(countries, borders_by_code)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded {len(metadata)} countries and their borders.")
+        )
+
+    def fetch_all(self, fields):
+        try:
+            response = requests.get(
+                RESTCOUNTRIES_ALL_URL, params={"fields": fields}, timeout=30
+            )
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            raise CommandError(f"Failed to fetch countries: {exc}") from exc
+        return orjson.loads(response.content)
@@ -9,10 +9,16 @@ class Name(models.Model):
         auto_now=True
     )  # Automatically updated each time the record is saved
 
+    class Meta:
+        # Covers the lookup by value and the freshness check on last_accessed
+        indexes = [models.Index(fields=["value", "last_accessed"])]
+
 
 class Country(models.Model):
     code = models.CharField(max_length=2, unique=True)  # Example: "US"
-    alpha3 = models.CharField(max_length=3, blank=True)
+    alpha3 = models.CharField(
+        max_length=3, blank=True, db_index=True
+    )  # Neighbors are resolved by alpha-3 code
     name = models.CharField(max_length=100)  # Example: "United States"
     official_name = models.CharField(max_length=150, blank=True, null=True)
     region = models.CharField(
@@ -50,11 +56,16 @@ class CountryBorder(models.Model):
         # Ensure that each country pair is unique
         unique_together = ("from_country", "to_country")
 
-    def save(self, *args, **kwargs):
-        # Compare by alphabetical order of country codes
-        if self.from_country.code > self.to_country.code:
+    def clean(self):
+        # Code paths that write borders store pairs sorted by country code; normalize
+        # manually entered pairs (e.g. via full_clean()) the same way so A–B and B–A
+        # can't both exist. Runs before the unique_together check in full_clean()
+        if (
+            self.from_country_id
+            and self.to_country_id
+            and self.from_country.code > self.to_country.code
+        ):
             self.from_country, self.to_country = self.to_country, self.from_country
-        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.from_country.code} ↔ {self.to_country.code}"  # Use symmetric arrow to reflect bidirectional border
@@ -77,6 +88,8 @@ class NameCountryStat(models.Model):
     class Meta:
         # Ensure only one record exists per name-country pair
         unique_together = ("name", "country")
+        # Serves the per-country "top names by probability" query
+        indexes = [models.Index(fields=["country", "-probability"])]
 
     def __str__(self):
         return f"{self.name.value} → {self.country.code} (prob: {self.probability})"
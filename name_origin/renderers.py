@@ -0,0 +1,44 @@
+import orjson
+from django.utils.http import parse_header_parameters
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# DRF's encoder handles the types orjson doesn't serialize natively (lazy translation
+# strings, Decimal, querysets, ...). Datetimes are passed through to it as well so they
+# keep DRF's format (millisecond precision, "Z" for UTC)
+_fallback_encoder = JSONEncoder()
+
+
+# JSON renderer backed by orjson. Output matches DRF's compact JSONRenderer except for
+# floats: NaN/Infinity render as null instead of raising (STRICT_JSON), and exponents
+# are written without a sign (1e16, not 1e+16)
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            # orjson only supports two-space indentation
+            option |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=_fallback_encoder.default, option=option)
+        # Like JSONRenderer, escape the line/paragraph separators that are valid in JSON
+        # but not in JavaScript source, since input such as the name query is echoed back
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        # Same lookup as JSONRenderer: the browsable API asks for
+        # "application/json; indent=4"
+        if accepted_media_type:
+            _, params = parse_header_parameters(accepted_media_type)
+            try:
+                return max(min(int(params["indent"]), 8), 0)
+            except (KeyError, ValueError, TypeError):
+                pass
+        return renderer_context.get("indent")
@@ -1,12 +1,54 @@
+import hashlib
+from unittest import mock
+import orjson
+import requests
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from datetime import UTC, datetime, timedelta
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
-from name_origin.models import Country, Name, NameCountryStat
+from name_origin.authentication import CachedJWTAuthentication
+from name_origin.renderers import ORJSONRenderer
+from name_origin.models import Country, CountryBorder, Name, NameCountryStat
+from name_origin.views import NameStatsView
+
+
+def fake_response(payload, ok=True):
+    return mock.Mock(ok=ok, content=orjson.dumps(payload))
+
+
+# Minimal upstream payloads for a name predicted in two neighboring countries
+NATIONALIZE_PAYLOAD = {
+    "name": "Olena",
+    "country": [
+        {"country_id": "UA", "probability": 0.6},
+        {"country_id": "PL", "probability": 0.2},
+    ],
+}
+RESTCOUNTRIES_PAYLOADS = {
+    "UA": [{"name": {"common": "Ukraine"}, "cca3": "UKR", "borders": ["POL"]}],
+    "PL": [{"name": {"common": "Poland"}, "cca3": "POL", "borders": ["UKR"]}],
+}
+
+
+def fake_upstream_get(url, *args, **kwargs):
+    if "nationalize.io" in url:
+        return fake_response(NATIONALIZE_PAYLOAD)
+    code = url.rsplit("/", 1)[-1]
+    return fake_response(
+        RESTCOUNTRIES_PAYLOADS.get(code), ok=code in RESTCOUNTRIES_PAYLOADS
+    )
 
 
 class NameStatsViewTest(APITestCase):
     def setUp(self):
+        cache.clear()
+
         # Create user and generate JWT token
         self.user = User.objects.create_user(
             username="testuser", password="testpass123"
@@ -35,7 +77,46 @@ class NameStatsViewTest(APITestCase):
         response = self.client.get("/api/v1/names/?name=John", **self.auth_headers)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["name"], "John")
-        self.assertIn("countries", response.data)
+        self.assertEqual(
+            response.data["countries"],
+            [{"code": "US", "name": "United States", "probability": 0.75}],
+        )
+
+    def test_cached_name_coalesces_counter_writes(self):
+        # Should write the first hit right away and batch later ones into the next flush
+        self.client.get("/api/v1/names/?name=John", **self.auth_headers)
+        self.client.get("/api/v1/names/?name=John", **self.auth_headers)
+        self.name.refresh_from_db()
+        self.assertEqual(self.name.count_of_requests, 3)
+
+        # Once the flush interval has passed, the pending hit is written with the new one
+        cache.delete(f"namehits:{self.name.pk}:flushed")
+        self.client.get("/api/v1/names/?name=John", **self.auth_headers)
+        self.name.refresh_from_db()
+        self.assertEqual(self.name.count_of_requests, 5)
+
+    def test_trailing_hits_of_idle_name_are_dropped(self):
+        # Should drop hits after the last flush once the name's counter expires
+        for _ in range(3):
+            self.client.get("/api/v1/names/?name=John", **self.auth_headers)
+        self.name.refresh_from_db()
+        self.assertEqual(self.name.count_of_requests, 3)  # Only the first hit flushed
+
+        # The name goes idle: both the pending counter and the flush marker expire
+        cache.delete_many(
+            [f"namehits:{self.name.pk}", f"namehits:{self.name.pk}:flushed"]
+        )
+        self.client.get("/api/v1/names/?name=John", **self.auth_headers)
+        self.name.refresh_from_db()
+        self.assertEqual(self.name.count_of_requests, 4)
+
+    def test_cached_name_survives_counter_eviction(self):
+        # Should still answer and count the hit when the counter is evicted before flush
+        with mock.patch.object(cache, "decr", side_effect=ValueError("evicted")):
+            response = self.client.get("/api/v1/names/?name=John", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        self.name.refresh_from_db()
+        self.assertEqual(self.name.count_of_requests, 3)
 
     def test_name_triggers_api_call(self):
         # Should trigger external API call for a new name
@@ -48,8 +129,156 @@ class NameStatsViewTest(APITestCase):
         self.assertEqual(response.status_code, 401)
 
 
+class NameStatsUpstreamTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.auth_headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token}"}
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_new_name_stores_countries_and_borders(self, mocked_get):
+        # Should store fetched countries and a single symmetric border between them
+        response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["code"] for c in response.data["countries"]], ["UA", "PL"])
+        self.assertEqual(CountryBorder.objects.count(), 1)
+        border = CountryBorder.objects.get()
+        self.assertEqual(
+            (border.from_country.code, border.to_country.code), ("PL", "UA")
+        )
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_stale_name_is_refetched(self, mocked_get):
+        # Should go back to Nationalize.io when the stored name is older than a day
+        name = Name.objects.create(value="Olena", count_of_requests=1)
+        Name.objects.filter(pk=name.pk).update(
+            last_accessed=timezone.now() - timedelta(days=2)
+        )
+        response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("nationalize.io", mocked_get.call_args_list[0].args[0])
+        name.refresh_from_db()
+        self.assertEqual(name.count_of_requests, 2)
+        self.assertEqual(name.country_stats.count(), 2)
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_new_name_refreshes_popular_names(self, mocked_get):
+        # Should drop the cached top names of every country the new name touched
+        ukraine = Country.objects.create(code="UA", name="Ukraine", alpha3="UKR")
+        NameCountryStat.objects.create(
+            name=Name.objects.create(value="Ivan"), country=ukraine, probability=0.4
+        )
+        url = "/api/v1/popular-names/?country=UA"
+        response = self.client.get(url, **self.auth_headers)
+        self.assertEqual(len(response.data["top_names"]), 1)
+
+        # Cache invalidation runs once the write transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        response = self.client.get(url, **self.auth_headers)
+        self.assertEqual(
+            [n["name"] for n in response.data["top_names"]], ["Olena", "Ivan"]
+        )
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_seeded_countries_skip_restcountries(self, mocked_get):
+        # Should store seeded countries with borders and not refetch them per name
+        seed_payload = [
+            {"cca2": code, **payload[0]}
+            for code, payload in RESTCOUNTRIES_PAYLOADS.items()
+        ]
+        with mock.patch(
+            "name_origin.management.commands.seed_countries.requests.get",
+            return_value=fake_response(seed_payload),
+        ):
+            call_command("seed_countries", stdout=mock.Mock())
+        self.assertEqual(Country.objects.count(), 2)
+        self.assertEqual(CountryBorder.objects.count(), 1)
+
+        response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mocked_get.call_count, 1)  # Nationalize.io only
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_concurrent_request_waits_for_lock_holder(self, mocked_get):
+        # Should read the name stored by the request holding the lock, not refetch it
+        lock_key = f"lock:name:{hashlib.sha256(b'Olena').hexdigest()}"
+        cache.add(lock_key, True)
+        ukraine = Country.objects.create(code="UA", name="Ukraine", alpha3="UKR")
+
+        def lock_holder_finishes(seconds):
+            name = Name.objects.create(value="Olena", count_of_requests=1)
+            NameCountryStat.objects.create(name=name, country=ukraine, probability=0.6)
+
+        with mock.patch(
+            "name_origin.views.time.sleep", side_effect=lock_holder_finishes
+        ):
+            response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["code"] for c in response.data["countries"]], ["UA"])
+        mocked_get.assert_not_called()
+
+    def test_concurrent_request_reuses_failed_lookup(self):
+        # Should return the lock holder's 404 instead of calling Nationalize.io again
+        lock_key = f"lock:name:{hashlib.sha256(b'Olena').hexdigest()}"
+        cache.add(lock_key, "other-request")
+
+        def lock_holder_fails(seconds):
+            cache.delete(lock_key)
+            self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+
+        with (
+            mock.patch(
+                "name_origin.views._http.get",
+                return_value=fake_response({"name": "Olena", "country": []}),
+            ) as mocked_get,
+            mock.patch("name_origin.views.time.sleep", side_effect=lock_holder_fails),
+        ):
+            response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(mocked_get.call_count, 1)
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_lock_taken_over_after_expiry_is_kept(self, mocked_get):
+        # Should not release a lock another request acquired after ours expired
+        lock_key = f"lock:name:{hashlib.sha256(b'Olena').hexdigest()}"
+        fetch_name = NameStatsView.fetch_name
+
+        def slow_fetch(view, name_value):
+            cache.set(lock_key, "other-request")
+            return fetch_name(view, name_value)
+
+        with mock.patch.object(NameStatsView, "fetch_name", slow_fetch):
+            response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.get(lock_key), "other-request")
+
+    @mock.patch("name_origin.views._http.get", side_effect=fake_upstream_get)
+    def test_stored_countries_are_not_refetched(self, mocked_get):
+        # Should only hit restcountries.com once per country across different names
+        self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        response = self.client.get("/api/v1/names/?name=Oksana", **self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        restcountries_urls = [
+            c.args[0] for c in mocked_get.call_args_list if "restcountries" in c.args[0]
+        ]
+        self.assertEqual(len(restcountries_urls), 2)
+
+    @mock.patch("name_origin.views._http.get", side_effect=requests.ConnectionError())
+    def test_upstream_failure_returns_502(self, mocked_get):
+        # Should return 502 instead of crashing when Nationalize.io is unreachable
+        response = self.client.get("/api/v1/names/?name=Olena", **self.auth_headers)
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertFalse(Name.objects.filter(value="Olena").exists())
+
+
 class PopularNamesViewTest(APITestCase):
     def setUp(self):
+        cache.clear()
+
         # Create user and JWT token
         self.user = User.objects.create_user(
             username="testuser", password="testpass123"
@@ -79,6 +308,8 @@ class PopularNamesViewTest(APITestCase):
         self.assertIn("top_names", response.data)
         self.assertEqual(len(response.data["top_names"]), 2)
         self.assertEqual(response.data["top_names"][0]["name"], "John")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(orjson.loads(response.content), response.data)
 
     def test_missing_country_param(self):
         # Should return 400 if country code is not provided
@@ -96,3 +327,72 @@ class PopularNamesViewTest(APITestCase):
         # Should return 401 for unauthenticated request
         response = self.client.get("/api/v1/popular-names/?country=US")
         self.assertEqual(response.status_code, 401)
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.auth_headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token}"}
+        Country.objects.create(code="US", name="United States", alpha3="USA")
+
+    def test_repeated_token_skips_user_lookup(self):
+        # Should only load the user once while the validated token is cached
+        with mock.patch.object(
+            CachedJWTAuthentication,
+            "get_user",
+            autospec=True,
+            side_effect=lambda auth, token: self.user,
+        ) as get_user:
+            for _ in range(2):
+                response = self.client.get(
+                    "/api/v1/popular-names/?country=US", **self.auth_headers
+                )
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(get_user.call_count, 1)
+
+    def test_invalid_token_rejected(self):
+        # Should still return 401 for a token that fails validation
+        response = self.client.get(
+            "/api/v1/popular-names/?country=US",
+            HTTP_AUTHORIZATION="Bearer not-a-token",
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class CountryBorderModelTest(TestCase):
+    def test_clean_sorts_pair_by_code(self):
+        # Should normalize a reversed pair so it is stored in alphabetical order
+        poland = Country.objects.create(code="PL", name="Poland", alpha3="POL")
+        ukraine = Country.objects.create(code="UA", name="Ukraine", alpha3="UKR")
+        border = CountryBorder(from_country=ukraine, to_country=poland)
+        border.full_clean()
+        self.assertEqual((border.from_country, border.to_country), (poland, ukraine))
+
+
+class ORJSONRendererTest(TestCase):
+    def test_matches_drf_json_renderer(self):
+        # Should produce the same bytes as DRF's JSONRenderer, including datetimes
+        data = {
+            "name": "John",
+            "probability": 0.75,
+            "last_accessed": datetime(2025, 5, 1, 12, 30, 15, 123456, UTC),
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_escapes_line_separators_like_drf(self):
+        # Should escape U+2028/U+2029 exactly as DRF's JSONRenderer does
+        data = {"error": "No countries found for name 'A\u2028B\u2029C'."}
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+        self.assertIn(b"\\u2028", rendered)
+
+    def test_indent_from_media_type(self):
+        # Should pretty print when the browsable API asks for an indent
+        rendered = ORJSONRenderer().render(
+            {"name": "John"}, accepted_media_type="application/json; indent=4"
+        )
+        self.assertEqual(rendered, b'{\n  "name": "John"\n}')
@@ -1,12 +1,68 @@
+import hashlib
+import time
+import uuid
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from django.utils.timezone import now, timedelta
 from rest_framework import status
+import orjson
 import requests
-from .models import Name, Country, NameCountryStat, CountryBorder
-from .serializers import CompactCountryStatSerializer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from .models import Name, Country, NameCountryStat
+from .countries import parse_country_data, save_borders, save_countries
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 
+# Upper bound on concurrent restcountries.com requests per name lookup
+MAX_COUNTRY_FETCH_WORKERS = 8
+
+# Single-flight lock for upstream lookups of one name. Other requests poll the DB until
+# the holder is done, then take the lock themselves if nothing was stored. The timeout
+# only frees the lock of a crashed holder, so it is kept above the worst-case lookup:
+# Nationalize.io then restcountries.com, each up to 3 attempts of UPSTREAM_TIMEOUT
+NAME_FETCH_LOCK_TIMEOUT = 60
+NAME_FETCH_WAIT_INTERVAL = 0.1
+
+# How long a failed lookup's response (404/502) is kept for the requests waiting on it
+NAME_FETCH_RESULT_TIMEOUT = 5
+
+# Minimum seconds between request-counter writes for a name served from the local DB
+REQUEST_COUNT_FLUSH_INTERVAL = 60
+
+# Lifetime of a name's pending-hit counter. Longer than the flush interval, so counters of
+# names that are still requested survive until their next flush; hits still pending when
+# a counter expires are dropped
+REQUEST_COUNT_CACHE_TIMEOUT = REQUEST_COUNT_FLUSH_INTERVAL * 10
+
+# Top names per country are recomputed at most every 10 minutes; a name lookup that
+# changes a country's probabilities drops its entry right away
+POPULAR_NAMES_CACHE_TIMEOUT = 60 * 10
+
+# (connect, read) timeout in seconds for upstream API calls
+UPSTREAM_TIMEOUT = (2, 5)
+
+# Shared HTTP session: keeps connections to nationalize.io / restcountries.com alive
+# between requests so we don't pay for a new TCP + TLS handshake on every call
+_http = requests.Session()
+_http.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]
+        ),
+    ),
+)
+
+
+def popular_names_cache_key(country_code):
+    return f"popnames:{country_code}"
+
 
 class NameStatsView(APIView):
     @extend_schema(
@@ -33,6 +89,7 @@ class NameStatsView(APIView):
             404: OpenApiResponse(
                 description="No country data found for the given name."
             ),
+            502: OpenApiResponse(description="Nationalize.io request failed."),
         },
     )
     def get(self, request):
@@ -43,22 +100,73 @@ class NameStatsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Check if name already exists in DB
+        # If the name is cached and fresh (accessed within the last day) → use it
+        name_obj = self.get_fresh_name(name_value)
+        if name_obj is not None:
+            return self.cached_response(name_obj)
+
+        # Only one request at a time fetches a given name from the upstream APIs;
+        # concurrent requests for it wait for the holder's result instead
+        name_key = hashlib.sha256(name_value.encode()).hexdigest()
+        lock_key = f"lock:name:{name_key}"
+        result_key = f"lock:name:{name_key}:result"
+        token = uuid.uuid4().hex
+        while not cache.add(lock_key, token, timeout=NAME_FETCH_LOCK_TIMEOUT):
+            time.sleep(NAME_FETCH_WAIT_INTERVAL)
+            name_obj = self.get_fresh_name(name_value)
+            if name_obj is not None:
+                return self.cached_response(name_obj)
+            failed = cache.get(result_key)
+            if failed is not None:
+                # The holder's lookup failed; share its response rather than retry
+                return Response(failed["data"], status=failed["status"])
+
         try:
-            name_obj = Name.objects.get(value=name_value)
-            # If cached and fresh → use it
-            if name_obj.last_accessed >= now() - timedelta(days=1):
-                name_obj.count_of_requests += 1
-                name_obj.save(update_fields=["count_of_requests", "last_accessed"])
-                stats = NameCountryStat.objects.filter(name=name_obj)
-                serialized = CompactCountryStatSerializer(stats, many=True)
-                return Response({"name": name_obj.value, "countries": serialized.data})
-        except Name.DoesNotExist:
-            name_obj = None  # Mark as missing
+            response = self.fetch_name(name_value)
+            if response.status_code != status.HTTP_200_OK:
+                cache.set(
+                    result_key,
+                    {"status": response.status_code, "data": response.data},
+                    timeout=NAME_FETCH_RESULT_TIMEOUT,
+                )
+            return response
+        finally:
+            # Leave the lock alone if it expired and another request now holds it.
+            # get + delete isn't atomic, but the window is far shorter than the timeout
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
 
+    def get_fresh_name(self, name_value):
+        # Freshness is checked in SQL, so a stale or missing name costs one cheap lookup
+        return (
+            Name.objects.filter(
+                value=name_value, last_accessed__gte=now() - timedelta(days=1)
+            )
+            .only("id", "value")
+            .first()
+        )
+
+    def cached_response(self, name_obj):
+        self.record_cached_hit(name_obj)
+        return Response(
+            {"name": name_obj.value, "countries": self.get_country_stats(name_obj)}
+        )
+
+    def fetch_name(self, name_value):
         # Fetch prediction data from Nationalize.io
-        response = requests.get(f"https://api.nationalize.io/?name={name_value}")
-        data = response.json()
+        try:
+            response = _http.get(
+                "https://api.nationalize.io/",
+                params={"name": name_value},
+                timeout=UPSTREAM_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+        except (requests.RequestException, ValueError):
+            return Response(
+                {"error": "Name prediction service is unavailable."},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
 
         if not data.get("country"):
             return Response(
@@ -66,93 +174,132 @@ class NameStatsView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Create or retrieve the Name object
-        name_obj, created = Name.objects.get_or_create(value=name_value)
+        # Countries already stored with metadata (seeded with `manage.py seed_countries`
+        # or saved for an earlier name) need no restcountries.com call and no border
+        # resolution; only unknown ones are fetched
+        codes = [country_info["country_id"] for country_info in data["country"]]
+        countries = Country.objects.exclude(alpha3="").in_bulk(codes, field_name="code")
+        missing_codes = [code for code in codes if code not in countries]
 
-        # Increment request counter and update access time
-        name_obj.count_of_requests += 1
-        name_obj.save(update_fields=["count_of_requests", "last_accessed"])
+        metadata = {}
+        if missing_codes:
+            # Fetch country metadata from restcountries.com (e.g. flags, region, borders).
+            # The calls are I/O-bound, so run them concurrently instead of one after another
+            with ThreadPoolExecutor(
+                max_workers=min(len(missing_codes), MAX_COUNTRY_FETCH_WORKERS)
+            ) as executor:
+                metadata = dict(
+                    zip(
+                        missing_codes,
+                        executor.map(self.fetch_country_data, missing_codes),
+                    )
+                )
 
-        for country_info in data["country"]:
-            country_code = country_info["country_id"]
+        # All upstream calls are done; store everything in one transaction (one commit
+        # instead of one per statement)
+        with transaction.atomic():
+            # Create or retrieve the Name object
+            name_obj, created = Name.objects.get_or_create(value=name_value)
 
-            # Fetch country metadata from restcountries.com (e.g. flags, region, borders)
-            country_data = self.fetch_country_data(country_code)
+            # Increment request counter and update access time
+            self.record_request(name_obj)
 
-            # Extract borders (list of ISO alpha-3 codes) and remove from dictionary
-            # so we can pass the rest to defaults safely
-            borders = country_data.pop("borders", [])
+            if metadata:
+                borders_by_code = save_countries(metadata)
+                # bulk_create() doesn't return primary keys for conflicting rows, so reload them
+                countries = Country.objects.in_bulk(codes, field_name="code")
+                save_borders(countries, borders_by_code)
 
-            # Create or retrieve the Country object using ISO alpha-2 code
-            country, _ = Country.objects.get_or_create(
-                code=country_code, defaults=country_data
+            # Save or update the probability for every name–country pair at once
+            NameCountryStat.objects.bulk_create(
+                [
+                    NameCountryStat(
+                        name=name_obj,
+                        country=countries[country_info["country_id"]],
+                        probability=country_info["probability"],
+                    )
+                    for country_info in data["country"]
+                ],
+                update_conflicts=True,
+                unique_fields=["name", "country"],
+                update_fields=["probability"],
             )
 
-            # Save or update the probability for name–country pair
-            NameCountryStat.objects.update_or_create(
-                name=name_obj,
-                country=country,
-                defaults={"probability": country_info["probability"]},
+            # Probabilities changed for these countries, so their top names may be outdated
+            transaction.on_commit(
+                lambda: cache.delete_many(
+                    [popular_names_cache_key(code) for code in codes]
+                )
             )
 
-            # For each bordering country code (ISO alpha-3), find the matching country by alpha3 field
-            for border_code in borders:
-                try:
-                    # Try to find the neighbor country using its alpha-3 code
-                    neighbor = Country.objects.get(alpha3=border_code)
-                except Country.DoesNotExist:
-                    # If the country hasn't been created yet (e.g. not in any name result), skip it
-                    continue
-
-                # Always store borders in sorted order to prevent duplicate A–B and B–A records
-                from_country, to_country = sorted(
-                    [country, neighbor], key=lambda c: c.code
-                )
+        # Return freshly collected name–country probabilities
+        return Response(
+            {"name": name_obj.value, "countries": self.get_country_stats(name_obj)}
+        )
 
-                # Store borders only if they don't already exist (symmetrically)
-                if not CountryBorder.objects.filter(
-                    from_country=from_country, to_country=to_country
-                ).exists():
-                    CountryBorder.objects.create(
-                        from_country=from_country, to_country=to_country
-                    )
+    def record_request(self, name_obj, count=1):
+        # Increment the counter in SQL so concurrent requests can't overwrite each other.
+        # update() bypasses auto_now, so last_accessed is set explicitly
+        Name.objects.filter(pk=name_obj.pk).update(
+            count_of_requests=F("count_of_requests") + count, last_accessed=now()
+        )
 
-        # Return freshly collected name–country probabilities
-        stats = NameCountryStat.objects.filter(name=name_obj)
-        serialized = CompactCountryStatSerializer(stats, many=True)
-        return Response({"name": name_obj.value, "countries": serialized.data})
+    def record_cached_hit(self, name_obj):
+        # Hits served from the local DB are counted in the cache and written to the row
+        # at most once per REQUEST_COUNT_FLUSH_INTERVAL, so hot names don't turn every
+        # read into an UPDATE. This trades accuracy for fewer writes: hits after a
+        # name's last flush are only written if the name is requested again before its
+        # counter expires (REQUEST_COUNT_CACHE_TIMEOUT). Otherwise they are lost, as they
+        # are when the cache is cleared (e.g. a restart with LocMemCache), so
+        # count_of_requests is a lower bound
+        hits_key = f"namehits:{name_obj.pk}"
+        cache.add(hits_key, 0, timeout=REQUEST_COUNT_CACHE_TIMEOUT)
+        try:
+            pending = cache.incr(hits_key)
+        except ValueError:
+            # The counter was evicted between add() and incr(); write this hit directly
+            self.record_request(name_obj)
+            return
+
+        if cache.add(
+            f"namehits:{name_obj.pk}:flushed",
+            True,
+            timeout=REQUEST_COUNT_FLUSH_INTERVAL,
+        ):
+            try:
+                cache.decr(hits_key, pending)
+                # Keep an active counter alive; idle ones expire instead of piling up
+                cache.touch(hits_key, timeout=REQUEST_COUNT_CACHE_TIMEOUT)
+            except ValueError:
+                # The counter was evicted after incr(); the hits read above still count
+                pass
+            self.record_request(name_obj, pending)
+
+    def get_country_stats(self, name_obj):
+        # Compact name–country probabilities (same shape as CompactCountryStatSerializer),
+        # built from plain rows to skip model instantiation and serializer overhead
+        rows = NameCountryStat.objects.filter(name=name_obj).values(
+            "country__code", "country__name", "probability"
+        )
+        return [
+            {
+                "code": row["country__code"],
+                "name": row["country__name"],
+                "probability": round(row["probability"], 4),
+            }
+            for row in rows
+        ]
 
     def fetch_country_data(self, code):
         url = f"https://restcountries.com/v3.1/alpha/{code}"
-        r = requests.get(url)
+        try:
+            r = _http.get(url, timeout=UPSTREAM_TIMEOUT)
+        except requests.RequestException:
+            return {}
         if not r.ok:
             return {}
 
-        data = r.json()[0]
-
-        return {
-            # Extract key metadata for country creation
-            "name": data.get("name", {}).get("common"),
-            "official_name": data.get("name", {}).get("official"),
-            "alpha3": data.get("cca3"),
-            "region": data.get("region"),
-            "independent": data.get("independent"),
-            "capital": (data.get("capital") or [None])[0],
-            "capital_lat": (data.get("capitalInfo", {}).get("latlng") or [None, None])[
-                0
-            ],
-            "capital_lng": (data.get("capitalInfo", {}).get("latlng") or [None, None])[
-                1
-            ],
-            "google_maps_url": data.get("maps", {}).get("googleMaps"),
-            "openstreetmap_url": data.get("maps", {}).get("openStreetMaps"),
-            "flag_png": data.get("flags", {}).get("png"),
-            "flag_svg": data.get("flags", {}).get("svg"),
-            "flag_alt": data.get("flags", {}).get("alt"),
-            "coat_of_arms_png": data.get("coatOfArms", {}).get("png"),
-            "coat_of_arms_svg": data.get("coatOfArms", {}).get("svg"),
-            "borders": data.get("borders", []),
-        }
+        return parse_country_data(orjson.loads(r.content)[0])
 
 
 class PopularNamesView(APIView):
@@ -193,10 +340,18 @@ class PopularNamesView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Aggregate top 5 most frequent names associated with this country
+        # Serve the precomputed top names when available
+        cache_key = popular_names_cache_key(country.code)
+        payload = cache.get(cache_key)
+        if payload is not None:
+            return Response(payload)
+
+        # Aggregate top 5 most frequent names associated with this country,
+        # loading only the columns used in the response
         stats = (
             NameCountryStat.objects.filter(country=country)
             .select_related("name")
+            .only("probability", "name__value", "name__count_of_requests")
             .order_by("-probability")[:5]
         )
 
@@ -206,16 +361,16 @@ class PopularNamesView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        return Response(
-            {
-                "country": country.code,
-                "top_names": [
-                    {
-                        "name": stat.name.value,
-                        "probability": round(stat.probability, 4),
-                        "count_of_requests": stat.name.count_of_requests,
-                    }
-                    for stat in stats
-                ],
-            }
-        )
+        payload = {
+            "country": country.code,
+            "top_names": [
+                {
+                    "name": stat.name.value,
+                    "probability": round(stat.probability, 4),
+                    "count_of_requests": stat.name.count_of_requests,
+                }
+                for stat in stats
+            ],
+        }
+        cache.set(cache_key, payload, timeout=POPULAR_NAMES_CACHE_TIMEOUT)
+        return Response(payload)